@@ -3,18 +3,40 @@ CRUD operations for the food tracking system.
 Provides functions to create, read, update, and delete food items and nutrition logs.
 """
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, TYPE_CHECKING
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, asc
-from datetime import datetime, date
-import pandas as pd
+from sqlalchemy import and_, or_, desc, asc, insert
+from datetime import datetime, date, timedelta
+from uuid import UUID
 import logging
+import threading
+from cachetools import TTLCache
 
 from models import Food, NutritionLog
 from database import get_db_session
 
+# pandas is only needed for DataFrame imports, so it is imported there
+# rather than on every startup
+if TYPE_CHECKING:
+    import pandas as pd
+
 logger = logging.getLogger(__name__)
 
+# Short-lived barcode -> food ID cache for repeated scans of the same item.
+# Only IDs are cached, never ORM objects, so entries are safe across sessions.
+barcode_cache = TTLCache(maxsize=4096, ttl=30)
+barcode_cache_lock = threading.Lock()
+
+# Rows per bulk INSERT/UPDATE statement in bulk imports
+BULK_IMPORT_CHUNK_SIZE = 1000
+
+
+def invalidate_barcode_cache(*barcodes: Optional[str]) -> None:
+    """Drop cached barcode lookups after foods are created, changed or deleted."""
+    with barcode_cache_lock:
+        for barcode in barcodes:
+            barcode_cache.pop(barcode, None)
+
 
 # Food CRUD Operations
 
@@ -34,6 +56,7 @@ def create_food(db: Session, food_data: Dict[str, Any]) -> Food:
         db.add(food)
         db.commit()
         db.refresh(food)
+        invalidate_barcode_cache(food.barcode)
         logger.info(f"Created food item: {food.name} (barcode: {food.barcode})")
         return food
     except Exception as e:
@@ -42,6 +65,32 @@ def create_food(db: Session, food_data: Dict[str, Any]) -> Food:
         raise
 
 
+def create_foods_bulk(db: Session, records: List[Dict[str, Any]], commit: bool = True) -> int:
+    """
+    Create multiple food items with a single executemany INSERT.
+    Use this instead of create_food when inserting many rows at once.
+    
+    Args:
+        db: Database session
+        records: List of dictionaries containing food information
+        commit: Whether to commit; pass False to leave it to the caller's transaction
+        
+    Returns:
+        int: Number of food items created
+    """
+    try:
+        db.execute(insert(Food), records)
+        if commit:
+            db.commit()
+        invalidate_barcode_cache(*(record.get('barcode') for record in records))
+        logger.info(f"Created {len(records)} food items")
+        return len(records)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error creating food items: {e}")
+        raise
+
+
 def get_food_by_barcode(db: Session, barcode: str) -> Optional[Food]:
     """
     Get a food item by its barcode.
@@ -53,10 +102,23 @@ def get_food_by_barcode(db: Session, barcode: str) -> Optional[Food]:
     Returns:
         Food or None: The food item if found, None otherwise
     """
-    return db.query(Food).filter(Food.barcode == barcode).first()
+    with barcode_cache_lock:
+        food_id = barcode_cache.get(barcode)
+    
+    if food_id is not None:
+        # Primary-key lookup, served from the session identity map when possible
+        food = db.get(Food, food_id)
+        if food is not None and food.barcode == barcode:
+            return food
+    
+    food = db.query(Food).filter(Food.barcode == barcode).first()
+    if food is not None:
+        with barcode_cache_lock:
+            barcode_cache[barcode] = food.id
+    return food
 
 
-def get_food_by_id(db: Session, food_id: str) -> Optional[Food]:
+def get_food_by_id(db: Session, food_id: UUID) -> Optional[Food]:
     """
     Get a food item by its ID.
     
@@ -67,22 +129,26 @@ def get_food_by_id(db: Session, food_id: str) -> Optional[Food]:
     Returns:
         Food or None: The food item if found, None otherwise
     """
-    return db.query(Food).filter(Food.id == food_id).first()
+    return db.get(Food, food_id)
 
 
-def get_all_foods(db: Session, skip: int = 0, limit: int = 100) -> List[Food]:
+def get_all_foods(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None) -> List[Food]:
     """
-    Get all food items with pagination.
+    Get all food items with pagination, ordered by ID.
     
     Args:
         db: Database session
         skip: Number of records to skip
         limit: Maximum number of records to return
+        after_id: Keyset cursor; only return foods with an ID after this one
         
     Returns:
         List[Food]: List of food items
     """
-    return db.query(Food).offset(skip).limit(limit).all()
+    query = db.query(Food)
+    if after_id is not None:
+        query = query.filter(Food.id > after_id)
+    return query.order_by(Food.id).offset(skip).limit(limit).all()
 
 
 def search_foods(db: Session, query: str, skip: int = 0, limit: int = 100) -> List[Food]:
@@ -106,7 +172,7 @@ def search_foods(db: Session, query: str, skip: int = 0, limit: int = 100) -> Li
     ).offset(skip).limit(limit).all()
 
 
-def update_food(db: Session, food_id: str, food_data: Dict[str, Any]) -> Optional[Food]:
+def update_food(db: Session, food_id: UUID, food_data: Dict[str, Any]) -> Optional[Food]:
     """
     Update a food item.
     
@@ -119,16 +185,18 @@ def update_food(db: Session, food_id: str, food_data: Dict[str, Any]) -> Optiona
         Food or None: The updated food item if found, None otherwise
     """
     try:
-        food = db.query(Food).filter(Food.id == food_id).first()
+        food = db.get(Food, food_id)
         if not food:
             return None
             
+        old_barcode = food.barcode
         for key, value in food_data.items():
             if hasattr(food, key):
                 setattr(food, key, value)
         
         db.commit()
         db.refresh(food)
+        invalidate_barcode_cache(old_barcode, food.barcode)
         logger.info(f"Updated food item: {food.name} (ID: {food.id})")
         return food
     except Exception as e:
@@ -137,7 +205,7 @@ def update_food(db: Session, food_id: str, food_data: Dict[str, Any]) -> Optiona
         raise
 
 
-def update_quantity(db: Session, food_id: str, quantity_change: int, action: str = "added") -> Optional[Food]:
+def update_quantity(db: Session, food_id: UUID, quantity_change: int, action: str = "added") -> Optional[Food]:
     """
     Update the quantity of a food item and log the change.
     
@@ -151,7 +219,7 @@ def update_quantity(db: Session, food_id: str, quantity_change: int, action: str
         Food or None: The updated food item if found, None otherwise
     """
     try:
-        food = db.query(Food).filter(Food.id == food_id).first()
+        food = db.get(Food, food_id)
         if not food:
             return None
         
@@ -175,7 +243,7 @@ def update_quantity(db: Session, food_id: str, quantity_change: int, action: str
         raise
 
 
-def delete_food(db: Session, food_id: str) -> bool:
+def delete_food(db: Session, food_id: UUID) -> bool:
     """
     Delete a food item.
     
@@ -187,12 +255,13 @@ def delete_food(db: Session, food_id: str) -> bool:
         bool: True if deleted successfully, False otherwise
     """
     try:
-        food = db.query(Food).filter(Food.id == food_id).first()
+        food = db.get(Food, food_id)
         if not food:
             return False
             
         db.delete(food)
         db.commit()
+        invalidate_barcode_cache(food.barcode)
         logger.info(f"Deleted food item: {food.name} (ID: {food_id})")
         return True
     except Exception as e:
@@ -203,7 +272,7 @@ def delete_food(db: Session, food_id: str) -> bool:
 
 # Nutrition Log Operations
 
-def log_nutrition_event(db: Session, food_id: str, quantity: int, action: str) -> NutritionLog:
+def log_nutrition_event(db: Session, food_id: UUID, quantity: int, action: str) -> NutritionLog:
     """
     Log a nutrition event (consumption, addition, etc.).
     
@@ -233,7 +302,7 @@ def log_nutrition_event(db: Session, food_id: str, quantity: int, action: str) -
         raise
 
 
-def get_nutrition_logs(db: Session, food_id: Optional[str] = None, 
+def get_nutrition_logs(db: Session, food_id: Optional[UUID] = None, 
                       skip: int = 0, limit: int = 100) -> List[NutritionLog]:
     """
     Get nutrition logs, optionally filtered by food ID.
@@ -256,7 +325,7 @@ def get_nutrition_logs(db: Session, food_id: Optional[str] = None,
 
 # Bulk Import Operations
 
-def bulk_import_from_dataframe(df: pd.DataFrame) -> Dict[str, Any]:
+def bulk_import_from_dataframe(df: "pd.DataFrame") -> Dict[str, Any]:
     """
     Import food data from a pandas DataFrame.
     Performs upsert operations (insert or update if barcode exists).
@@ -264,47 +333,103 @@ def bulk_import_from_dataframe(df: pd.DataFrame) -> Dict[str, Any]:
     Args:
         df: Pandas DataFrame containing food data
         
+    Returns:
+        Dict: Summary of import results
+    """
+    import pandas as pd
+    
+    # Clean the whole frame once: drop empty columns, parse expiry dates
+    # (invalid dates become missing) and turn NaN/NaT into None
+    df = df.dropna(axis=1, how='all')
+    if 'expiry_date' in df.columns:
+        df = df.assign(expiry_date=pd.to_datetime(df['expiry_date'], errors='coerce').dt.date)
+    records = df.astype(object).where(df.notna(), None).to_dict(orient='records')
+    
+    return bulk_import_records(records)
+
+
+def parse_expiry_date(value: Any) -> Optional[date]:
+    """
+    Parse an imported expiry date. Invalid dates become None, like missing ones.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date) or value is None:
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def bulk_import_records(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Import food data from a list of dictionaries, e.g. a JSON request body.
+    Performs upsert operations (insert or update if barcode exists).
+    Existing foods are looked up with one query, and all updates and inserts
+    are written with bulk operations, in chunks of BULK_IMPORT_CHUNK_SIZE
+    rows, in a single transaction.
+    
+    Args:
+        records: List of dictionaries containing food data
+        
     Returns:
         Dict: Summary of import results
     """
     results = {
-        "total_rows": len(df),
+        "total_rows": len(records),
         "inserted": 0,
         "updated": 0,
         "errors": 0,
         "error_details": []
     }
     
+    food_columns = {column.key for column in Food.__table__.columns}
+    
     with get_db_session() as db:
-        for index, row in df.iterrows():
+        # Look up every barcode in the import with a single query
+        # Barcodes are compared as strings; CSV and JSON imports often give numbers
+        barcodes = {str(record['barcode']) for record in records if record.get('barcode') is not None}
+        existing_food_ids = {}
+        for food_id, barcode in db.query(Food.id, Food.barcode).filter(Food.barcode.in_(barcodes)):
+            existing_food_ids.setdefault(barcode, food_id)
+        
+        # Mappings keyed by food ID (updates) and barcode (inserts), so a
+        # barcode repeated within the import updates the same row
+        update_mappings = {}
+        insert_mappings = {}
+        
+        for index, food_data in enumerate(records):
             try:
-                # Convert row to dictionary, handling NaN values
-                food_data = row.to_dict()
-                food_data = {k: v for k, v in food_data.items() if pd.notna(v)}
-                
-                # Convert expiry_date string to date object if present
-                if 'expiry_date' in food_data and isinstance(food_data['expiry_date'], str):
-                    try:
-                        from datetime import datetime
-                        food_data['expiry_date'] = datetime.strptime(food_data['expiry_date'], '%Y-%m-%d').date()
-                    except ValueError:
-                        # Invalid date format, remove it
-                        food_data.pop('expiry_date', None)
-                
-                # Check if food already exists by barcode
-                existing_food = get_food_by_barcode(db, food_data.get('barcode'))
+                # Skip unknown columns and missing values (so they don't overwrite existing data)
+                food_data = {k: v for k, v in food_data.items() if v is not None and k in food_columns}
+                if 'expiry_date' in food_data:
+                    food_data['expiry_date'] = parse_expiry_date(food_data['expiry_date'])
+                    if food_data['expiry_date'] is None:
+                        del food_data['expiry_date']
+                if 'id' in food_data:
+                    food_data['id'] = UUID(str(food_data['id']))
+                if 'barcode' in food_data:
+                    food_data['barcode'] = str(food_data['barcode'])
+                barcode = food_data.get('barcode')
+                existing_food_id = existing_food_ids.get(barcode)
                 
-                if existing_food:
+                if existing_food_id:
                     # Update existing food
-                    for key, value in food_data.items():
-                        if hasattr(existing_food, key) and key != 'id':
-                            setattr(existing_food, key, value)
-                    db.commit()
+                    food_data.pop('id', None)
+                    update_mappings.setdefault(existing_food_id, {'id': existing_food_id}).update(food_data)
+                    results["updated"] += 1
+                    logger.info(f"Updated food: {food_data.get('name', 'Unknown')}")
+                elif barcode in insert_mappings:
+                    # Repeated barcode: merge into the pending insert
+                    insert_mappings[barcode].update(food_data)
                     results["updated"] += 1
                     logger.info(f"Updated food: {food_data.get('name', 'Unknown')}")
                 else:
-                    # Create new food
-                    create_food(db, food_data)
+                    missing = [field for field in ('barcode', 'name') if field not in food_data]
+                    if missing:
+                        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+                    insert_mappings[barcode] = food_data
                     results["inserted"] += 1
                     logger.info(f"Inserted food: {food_data.get('name', 'Unknown')}")
                     
@@ -313,55 +438,68 @@ def bulk_import_from_dataframe(df: pd.DataFrame) -> Dict[str, Any]:
                 error_msg = f"Row {index}: {str(e)}"
                 results["error_details"].append(error_msg)
                 logger.error(error_msg)
+        
+        updates = list(update_mappings.values())
+        inserts = list(insert_mappings.values())
+        for start in range(0, len(updates), BULK_IMPORT_CHUNK_SIZE):
+            db.bulk_update_mappings(Food, updates[start:start + BULK_IMPORT_CHUNK_SIZE])
+        for start in range(0, len(inserts), BULK_IMPORT_CHUNK_SIZE):
+            create_foods_bulk(db, inserts[start:start + BULK_IMPORT_CHUNK_SIZE], commit=False)
+        
+        # get_db_session() commits updates and inserts together on exit
     
     logger.info(f"Bulk import completed: {results['inserted']} inserted, {results['updated']} updated, {results['errors']} errors")
     return results
 
 
-def get_foods_by_category(db: Session, category: str) -> List[Food]:
+def get_foods_by_category(db: Session, category: str, limit: Optional[int] = None,
+                          after_id: Optional[UUID] = None) -> List[Food]:
     """
-    Get all foods in a specific category.
+    Get foods in a specific category, ordered by ID.
     
     Args:
         db: Database session
         category: The category to filter by
+        limit: Maximum number of records to return (None for all)
+        after_id: Keyset cursor; only return foods with an ID after this one
         
     Returns:
         List[Food]: List of foods in the category
     """
-    return db.query(Food).filter(Food.category == category).all()
+    query = db.query(Food).filter(Food.category == category)
+    if after_id is not None:
+        query = query.filter(Food.id > after_id)
+    return query.order_by(Food.id).limit(limit).all()
 
 
-def get_expiring_foods(db: Session, days_ahead: int = 7) -> List[Food]:
+def get_expiring_foods(db: Session, days_ahead: int = 7, limit: Optional[int] = None) -> List[Food]:
     """
     Get foods that are expiring within the specified number of days.
     
     Args:
         db: Database session
         days_ahead: Number of days to look ahead for expiration
+        limit: Maximum number of records to return (None for all)
         
     Returns:
         List[Food]: List of foods expiring soon
     """
-    from datetime import timedelta
-    expiry_date = date.today() + timedelta(days=days_ahead)
+    today = date.today()
     
     return db.query(Food).filter(
-        and_(
-            Food.expiry_date <= expiry_date,
-            Food.expiry_date >= date.today(),
-            Food.quantity > 0
-        )
-    ).order_by(asc(Food.expiry_date)).all()
+        Food.expiry_date.between(today, today + timedelta(days=days_ahead)),
+        Food.quantity > 0
+    ).order_by(asc(Food.expiry_date)).limit(limit).all()
 
 
-def get_low_stock_foods(db: Session, threshold: int = 5) -> List[Food]:
+def get_low_stock_foods(db: Session, threshold: int = 5, limit: Optional[int] = None) -> List[Food]:
     """
     Get foods with low stock (quantity below threshold).
     
     Args:
         db: Database session
         threshold: The quantity threshold for low stock
+        limit: Maximum number of records to return (None for all)
         
     Returns:
         List[Food]: List of foods with low stock
@@ -371,7 +509,7 @@ def get_low_stock_foods(db: Session, threshold: int = 5) -> List[Food]:
             Food.quantity <= threshold,
             Food.quantity >= 0
         )
-    ).order_by(asc(Food.quantity)).all()
+    ).order_by(asc(Food.quantity)).limit(limit).all()
 
 
 def delete_food_by_barcode(db: Session, barcode: str) -> bool:
@@ -393,6 +531,7 @@ def delete_food_by_barcode(db: Session, barcode: str) -> bool:
         for food in foods_to_delete:
             db.delete(food)
         db.commit()
+        invalidate_barcode_cache(barcode)
         return True
     except Exception as e:
         db.rollback()
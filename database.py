@@ -4,7 +4,7 @@ Handles PostgreSQL connections using SQLAlchemy.
 """
 
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 from contextlib import contextmanager
@@ -21,15 +21,46 @@ DATABASE_URL = os.getenv(
     "sqlite:///./food_tracking.db"  # Default to SQLite for easier setup
 )
 
+# Connection pool settings. Endpoints run in FastAPI's threadpool, so SQLite
+# connections must be usable from any thread. An in-memory database keeps a
+# single shared connection (each new one would be a new, empty database),
+# while file databases and servers get a real pool so concurrent requests
+# don't queue behind one connection.
+if DATABASE_URL.startswith("sqlite") and ":memory:" in DATABASE_URL:
+    pool_options = {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+elif DATABASE_URL.startswith("sqlite"):
+    pool_options = {"connect_args": {"check_same_thread": False}}
+else:
+    pool_options = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "5")),
+    }
+
 # Create engine with connection pooling
 engine = create_engine(
     DATABASE_URL,
-    poolclass=StaticPool,
     pool_pre_ping=True,
     pool_recycle=300,
-    echo=False  # Set to True for SQL query logging
+    echo=False,  # Set to True for SQL query logging
+    **pool_options
 )
 
+# Speed up writes on the default SQLite database
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        Use WAL journaling and fewer fsyncs for faster SQLite writes, and
+        enforce foreign keys, which SQLite leaves off by default.
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        cursor.close()
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -72,9 +103,42 @@ def create_tables():
     """Create all tables in the database."""
     from models import Base
     Base.metadata.create_all(bind=engine)
+    if engine.dialect.name == "sqlite":
+        migrate_sqlite_uuid_ids()
     logger.info("Database tables created successfully")
 
 
+def migrate_sqlite_uuid_ids():
+    """
+    Convert dashed 36-character text IDs written by older versions to the
+    32-character hex form the Uuid columns use on SQLite. Rows that are
+    already converted are left alone, so this is safe to run on every start.
+    """
+    with engine.begin() as conn:
+        # Parent and child IDs change in the same transaction, so check the
+        # foreign keys at commit rather than after each statement
+        conn.exec_driver_sql("PRAGMA defer_foreign_keys=ON")
+        foods = conn.exec_driver_sql(
+            "UPDATE foods SET id = replace(id, '-', '') WHERE id LIKE '%-%'"
+        ).rowcount
+        logs = conn.exec_driver_sql(
+            "UPDATE nutrition_logs SET id = replace(id, '-', ''), food_id = replace(food_id, '-', '') "
+            "WHERE id LIKE '%-%' OR food_id LIKE '%-%'"
+        ).rowcount
+    if foods or logs:
+        logger.info(f"Converted IDs to hex form: {foods} foods, {logs} nutrition logs")
+
+
+def is_foreign_key_violation(error: Exception) -> bool:
+    """Check whether a SQLAlchemy IntegrityError was caused by a foreign key."""
+    orig = getattr(error, "orig", None)
+    # PostgreSQL reports SQLSTATE 23503 (ForeignKeyViolation); sqlite3 only
+    # has the message to go on
+    if getattr(orig, "pgcode", None) == "23503":
+        return True
+    return "FOREIGN KEY constraint failed" in str(orig)
+
+
 def drop_tables():
     """Drop all tables in the database."""
     from models import Base
@@ -45,11 +45,11 @@ def example_basic_operations():
         print(f"Found by barcode: {found_food.name if found_food else 'Not found'}")
         
         # Update quantity (consume some)
-        updated_food = update_quantity(db, str(food.id), -5, "consumed")
+        updated_food = update_quantity(db, food.id, -5, "consumed")
         print(f"Updated quantity: {updated_food.quantity} units remaining")
         
         # Log a nutrition event
-        log_nutrition_event(db, str(food.id), 2, "consumed")
+        log_nutrition_event(db, food.id, 2, "consumed")
         print(f"Logged consumption of 2 units")
 
 
@@ -4,39 +4,26 @@ Provides REST API endpoints for managing food inventory and nutrition logs.
 """
 
 import os
-import sys
-
-# Set library path for pyzbar on macOS
-if sys.platform == 'darwin':
-    # Try to find zbar library
-    possible_paths = [
-        '/opt/homebrew/opt/zbar/lib',
-        '/usr/local/opt/zbar/lib',
-        '/opt/homebrew/lib'
-    ]
-    for path in possible_paths:
-        if os.path.exists(path):
-            os.environ.setdefault('DYLD_LIBRARY_PATH', path)
-            os.environ['DYLD_LIBRARY_PATH'] = f"{path}:{os.environ.get('DYLD_LIBRARY_PATH', '')}"
-            break
-
-from fastapi import FastAPI, Depends, HTTPException, status, Query
-import requests
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import FastAPI, Depends, HTTPException, status, Query, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
+from uuid import UUID
 from contextlib import asynccontextmanager
 import logging
-import pandas as pd
 from datetime import datetime
-import base64
-import io
 
-from database import get_db, create_tables, test_connection
+from database import get_db, create_tables, test_connection, is_foreign_key_violation
 from crud import (
     create_food, get_food_by_barcode, get_food_by_id, get_all_foods,
     search_foods, update_food, update_quantity, delete_food, delete_food_by_barcode,
-    log_nutrition_event, get_nutrition_logs, bulk_import_from_dataframe,
+    log_nutrition_event, get_nutrition_logs, bulk_import_records,
     get_foods_by_category, get_expiring_foods, get_low_stock_foods
 )
 from schemas import (
@@ -45,16 +32,25 @@ from schemas import (
     FoodInventoryResponse, ExpiringFoodsRequest, LowStockRequest, ErrorResponse,
     BarcodeImageUploadRequest, BarcodeImageUploadResponse
 )
-from barcode_detector import detect_barcodes_with_preprocessing, validate_barcode_format
+from barcode_detector import (
+    decode_image_data, detect_barcodes_with_preprocessing, validate_barcode_format,
+    init_detector_worker, warm_up_detector
+)
+from openfoodfacts import fetch_off_product, invalidate_off_product, product_to_food_data, close_clients
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of server processes (uvicorn also reads WEB_CONCURRENCY). CPU cores
+# are shared out between their barcode detection pools. Plain
+# `uvicorn main:app` runs a single process unless WEB_CONCURRENCY is set.
+WEB_WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+
 # Lifespan context manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup."""
+    """Initialize database and barcode workers on startup."""
     try:
         create_tables()
         if test_connection():
@@ -63,8 +59,36 @@ async def lifespan(app: FastAPI):
             logger.error("Database connection failed")
     except Exception as e:
         logger.error(f"Startup error: {e}")
+    
+    # Worker processes for CPU-bound barcode detection, so scans run in
+    # parallel across cores and don't hold the GIL in the server process.
+    # Some platforms (e.g. serverless functions) can't run a process pool;
+    # scans then fall back to the threadpool.
+    app.state.executor = None
+    executor = None
+    try:
+        workers = max(1, (os.cpu_count() or 1) // WEB_WORKERS)
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=init_detector_worker
+        )
+        
+        # Start and warm up the workers now rather than on the first uploads
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, warm_up_detector) for _ in range(workers)
+        ))
+        app.state.executor = executor
+    except Exception as e:
+        logger.error(f"Barcode worker processes unavailable, scanning in threads instead: {e}")
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
     yield
-    # Cleanup code can go here if needed
+    
+    if app.state.executor is not None:
+        # Waiting for the workers blocks, so do it off the event loop
+        await asyncio.to_thread(app.state.executor.shutdown, wait=True, cancel_futures=True)
+    await close_clients()
 
 # Create FastAPI app
 app = FastAPI(
@@ -73,6 +97,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -96,11 +121,11 @@ async def health_check():
 
 # Food endpoints
 @app.post("/foods/", response_model=FoodResponse, status_code=status.HTTP_201_CREATED)
-async def create_food_endpoint(food: FoodCreate, db: Session = Depends(get_db)):
+def create_food_endpoint(food: FoodCreate, db: Session = Depends(get_db)):
     """Create a new food item (allows duplicates)."""
     try:
         # Always create new food item (no duplicate checking)
-        food_data = food.dict()
+        food_data = food.model_dump()
         created_food = create_food(db, food_data)
         logger.info(f"Created new food: {food.barcode}")
         return created_food
@@ -115,7 +140,7 @@ async def create_food_endpoint(food: FoodCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/foods/{food_id}", response_model=FoodResponse)
-async def get_food_endpoint(food_id: str, db: Session = Depends(get_db)):
+def get_food_endpoint(food_id: UUID, db: Session = Depends(get_db)):
     """Get a food item by ID."""
     food = get_food_by_id(db, food_id)
     if not food:
@@ -127,7 +152,7 @@ async def get_food_endpoint(food_id: str, db: Session = Depends(get_db)):
 
 
 @app.get("/foods/barcode/{barcode}", response_model=FoodResponse)
-async def get_food_by_barcode_endpoint(barcode: str, db: Session = Depends(get_db)):
+def get_food_by_barcode_endpoint(barcode: str, db: Session = Depends(get_db)):
     """Get a food item by barcode."""
     food = get_food_by_barcode(db, barcode)
     if not food:
@@ -139,7 +164,7 @@ async def get_food_by_barcode_endpoint(barcode: str, db: Session = Depends(get_d
 
 
 @app.get("/foods/", response_model=List[FoodResponse])
-async def get_foods_endpoint(
+def get_foods_endpoint(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
@@ -150,7 +175,7 @@ async def get_foods_endpoint(
 
 
 @app.get("/foods/search/", response_model=List[FoodResponse])
-async def search_foods_endpoint(
+def search_foods_endpoint(
     q: str = Query(..., description="Search query"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
@@ -162,14 +187,14 @@ async def search_foods_endpoint(
 
 
 @app.put("/foods/{food_id}", response_model=FoodResponse)
-async def update_food_endpoint(
-    food_id: str,
+def update_food_endpoint(
+    food_id: UUID,
     food_update: FoodUpdate,
     db: Session = Depends(get_db)
 ):
     """Update a food item."""
-    # Filter out None values
-    update_data = {k: v for k, v in food_update.dict().items() if v is not None}
+    # Only fields the client actually sent, without None values
+    update_data = food_update.model_dump(exclude_unset=True, exclude_none=True)
     
     if not update_data:
         raise HTTPException(
@@ -187,8 +212,8 @@ async def update_food_endpoint(
 
 
 @app.put("/foods/{food_id}/quantity", response_model=FoodResponse)
-async def update_quantity_endpoint(
-    food_id: str,
+def update_quantity_endpoint(
+    food_id: UUID,
     quantity_update: QuantityUpdateRequest,
     db: Session = Depends(get_db)
 ):
@@ -205,7 +230,7 @@ async def update_quantity_endpoint(
 
 
 @app.delete("/foods/{food_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_food_endpoint(food_id: str, db: Session = Depends(get_db)):
+def delete_food_endpoint(food_id: UUID, db: Session = Depends(get_db)):
     """Delete a food item."""
     success = delete_food(db, food_id)
     if not success:
@@ -216,7 +241,7 @@ async def delete_food_endpoint(food_id: str, db: Session = Depends(get_db)):
 
 
 @app.delete("/foods/barcode/{barcode}", status_code=status.HTTP_200_OK)
-async def delete_food_by_barcode_endpoint(barcode: str, db: Session = Depends(get_db)):
+def delete_food_by_barcode_endpoint(barcode: str, db: Session = Depends(get_db)):
     """Delete all food items with a specific barcode."""
     success = delete_food_by_barcode(db, barcode)
     if not success:
@@ -227,19 +252,58 @@ async def delete_food_by_barcode_endpoint(barcode: str, db: Session = Depends(ge
     return {"message": f"All food items with barcode {barcode} have been deleted"}
 
 
-# Barcode image upload endpoint
+# Barcode image upload endpoints
 @app.post("/barcode/upload-image", response_model=BarcodeImageUploadResponse)
 async def upload_barcode_image(
     request: BarcodeImageUploadRequest,
     db: Session = Depends(get_db)
 ):
     """
-    Upload an image containing a barcode, detect it, fetch product data from OpenFoodFacts,
-    and optionally save to database.
+    Upload a base64 encoded image containing a barcode, detect it, fetch product data
+    from OpenFoodFacts, and optionally save to database.
+    """
+    # Decode the base64 payload once here, so only the raw image
+    # bytes are sent to the worker process
+    try:
+        image_bytes = decode_image_data(request.imageData)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="imageData is not valid base64"
+        )
+    
+    return await scan_barcode_image(image_bytes, request.imageFormat, request.action, db)
+
+
+@app.post("/barcode/upload-file", response_model=BarcodeImageUploadResponse)
+async def upload_barcode_file(
+    file: UploadFile = File(..., description="Image file containing a barcode"),
+    action: str = Form("scan", description="Action to perform: 'scan' or 'scan_and_save'"),
+    db: Session = Depends(get_db)
+):
+    """
+    Same as /barcode/upload-image, but takes the image as a multipart file upload,
+    which avoids the base64 size overhead and decoding.
+    """
+    image_bytes = await file.read()
+    image_format = (file.content_type or '').partition('/')[2] or 'jpeg'
+    
+    return await scan_barcode_image(image_bytes, image_format, action, db)
+
+
+async def scan_barcode_image(
+    image_bytes: bytes,
+    image_format: str,
+    action: str,
+    db: Session
+) -> BarcodeImageUploadResponse:
+    """
+    Detect a barcode in an uploaded image, fetch product data from OpenFoodFacts,
+    and save it to the database if action is 'scan_and_save'.
     """
     try:
         # Validate action
-        if request.action not in ['scan', 'scan_and_save']:
+        if action not in ['scan', 'scan_and_save']:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Action must be 'scan' or 'scan_and_save'"
@@ -247,7 +311,15 @@ async def upload_barcode_image(
         
         # Detect barcodes in the image
         logger.info("Detecting barcodes in uploaded image...")
-        barcodes = detect_barcodes_with_preprocessing(request.imageData, request.imageFormat)
+        executor = getattr(app.state, "executor", None)
+        if executor is not None:
+            barcodes = await asyncio.get_running_loop().run_in_executor(
+                executor, detect_barcodes_with_preprocessing, image_bytes, image_format
+            )
+        else:
+            barcodes = await run_in_threadpool(
+                detect_barcodes_with_preprocessing, image_bytes, image_format
+            )
         
         if not barcodes:
             return BarcodeImageUploadResponse(
@@ -268,18 +340,9 @@ async def upload_barcode_image(
         
         logger.info(f"Barcode detected: {barcode}")
         
-        # Fetch product data from OpenFoodFacts
-        openfoodfacts_url = f"https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
-        
+        # Fetch product data from OpenFoodFacts (cached by barcode)
         try:
-            response = requests.get(openfoodfacts_url, timeout=10)
-            
-            if response.status_code != 200 or response.json().get('status') == 0:
-                return BarcodeImageUploadResponse(
-                    success=True,
-                    barcode=barcode,
-                    message="Barcode detected but product not found in OpenFoodFacts database"
-                )
+            product = await fetch_off_product(barcode)
         except Exception as e:
             logger.error(f"Error fetching from OpenFoodFacts: {e}")
             return BarcodeImageUploadResponse(
@@ -288,37 +351,22 @@ async def upload_barcode_image(
                 error=str(e)
             )
         
-        product = response.json()['product']
-        
-        # Extract product information
-        # Process product data based on OpenFoodFacts structure
-        # Reference: https://world.openfoodfacts.org/
-        nutriments = product.get('nutriments', {})
-        
-        food_data = {
-            "barcode": barcode,
-            "name": product.get('product_name', 'Unknown Product').strip(),
-            "brand": product.get('brands', '').strip() or None,
-            "category": product.get('categories', '').split(',')[0].strip() if product.get('categories') else None,
-            "calories": round(nutriments.get('energy-kcal_100g', 0)) if nutriments.get('energy-kcal_100g') else None,
-            "protein": round(nutriments.get('proteins_100g', 0), 2) if nutriments.get('proteins_100g') else None,
-            "fat": round(nutriments.get('fat_100g', 0), 2) if nutriments.get('fat_100g') else None,
-            "carbs": round(nutriments.get('carbohydrates_100g', 0), 2) if nutriments.get('carbohydrates_100g') else None,
-            "fiber": round(nutriments.get('fiber_100g', 0), 2) if nutriments.get('fiber_100g') else None,
-            "sugars": round(nutriments.get('sugars_100g', 0), 2) if nutriments.get('sugars_100g') else None,
-            "sodium": round(nutriments.get('sodium_100g', 0), 2) if nutriments.get('sodium_100g') else None,
-            "allergens": product.get('allergens', '').split(',') if product.get('allergens') else [],
-            "quantity": 1
-        }
+        if product is None:
+            return BarcodeImageUploadResponse(
+                success=True,
+                barcode=barcode,
+                message="Barcode detected but product not found in OpenFoodFacts database"
+            )
         
-        # Remove None values
-        food_data = {k: v for k, v in food_data.items() if v is not None and v != '' and v != []}
+        # Map the product onto our food fields
+        food_data = product_to_food_data(barcode, product)
         
-        # If action is scan_and_save, save to database
-        if request.action == 'scan_and_save':
+        # If action is scan_and_save, save to database (in the threadpool,
+        # since database calls block)
+        if action == 'scan_and_save':
             try:
                 # Check if food already exists
-                existing_food = get_food_by_barcode(db, barcode)
+                existing_food = await run_in_threadpool(get_food_by_barcode, db, barcode)
                 if existing_food:
                     return BarcodeImageUploadResponse(
                         success=True,
@@ -328,7 +376,7 @@ async def upload_barcode_image(
                     )
                 
                 # Create food item
-                created_food = create_food(db, food_data)
+                created_food = await run_in_threadpool(create_food, db, food_data)
                 
                 logger.info(f"Successfully saved product {created_food.name} to database")
                 
@@ -366,30 +414,40 @@ async def upload_barcode_image(
         )
 
 
+@app.delete("/barcode/cache/{barcode}", status_code=status.HTTP_200_OK)
+async def invalidate_product_cache_endpoint(barcode: str):
+    """Drop cached OpenFoodFacts data for a barcode so the next scan refetches it."""
+    await invalidate_off_product(barcode)
+    return {"message": f"Cached product data for barcode {barcode} has been cleared"}
+
+
 # Nutrition log endpoints
 @app.post("/nutrition-logs/", response_model=NutritionLogResponse, status_code=status.HTTP_201_CREATED)
-async def create_nutrition_log_endpoint(
+def create_nutrition_log_endpoint(
     nutrition_log: NutritionLogCreate,
     db: Session = Depends(get_db)
 ):
     """Create a new nutrition log entry."""
-    # Verify food exists
-    food = get_food_by_id(db, str(nutrition_log.food_id))
-    if not food:
+    # The foreign key rejects unknown foods, so there is no need to look
+    # the food up first
+    try:
+        created_log = log_nutrition_event(
+            db, nutrition_log.food_id, nutrition_log.quantity, nutrition_log.action
+        )
+    except IntegrityError as e:
+        # Only an unknown food is a 404; other constraint failures are real errors
+        if not is_foreign_key_violation(e):
+            raise
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Food not found"
         )
-    
-    created_log = log_nutrition_event(
-        db, str(nutrition_log.food_id), nutrition_log.quantity, nutrition_log.action
-    )
     return created_log
 
 
 @app.get("/nutrition-logs/", response_model=List[NutritionLogResponse])
-async def get_nutrition_logs_endpoint(
-    food_id: Optional[str] = Query(None, description="Filter by food ID"),
+def get_nutrition_logs_endpoint(
+    food_id: Optional[UUID] = Query(None, description="Filter by food ID"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
@@ -401,15 +459,13 @@ async def get_nutrition_logs_endpoint(
 
 # Bulk operations
 @app.post("/foods/bulk-import", response_model=BulkImportResponse)
-async def bulk_import_endpoint(
+def bulk_import_endpoint(
     import_data: BulkImportRequest,
     db: Session = Depends(get_db)
 ):
     """Import multiple food items from a list."""
     try:
-        # Convert to DataFrame
-        df = pd.DataFrame(import_data.data)
-        results = bulk_import_from_dataframe(df)
+        results = bulk_import_records(import_data.data)
         return BulkImportResponse(**results)
     except Exception as e:
         logger.error(f"Bulk import error: {e}")
@@ -421,35 +477,39 @@ async def bulk_import_endpoint(
 
 # Inventory management endpoints
 @app.get("/inventory/", response_model=List[FoodResponse])
-async def get_inventory_endpoint(
+def get_inventory_endpoint(
     category: Optional[str] = Query(None, description="Filter by category"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[UUID] = Query(None, description="ID of the last food on the previous page"),
     db: Session = Depends(get_db)
 ):
-    """Get food inventory, optionally filtered by category."""
+    """Get food inventory, optionally filtered by category, one page at a time."""
     if category:
-        foods = get_foods_by_category(db, category)
+        foods = get_foods_by_category(db, category, limit=limit, after_id=cursor)
     else:
-        foods = get_all_foods(db)
+        foods = get_all_foods(db, limit=limit, after_id=cursor)
     return foods
 
 
 @app.get("/inventory/expiring", response_model=List[FoodResponse])
-async def get_expiring_foods_endpoint(
+def get_expiring_foods_endpoint(
     days_ahead: int = Query(7, ge=1, le=365, description="Days ahead to check"),
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
     """Get foods that are expiring within the specified number of days."""
-    foods = get_expiring_foods(db, days_ahead)
+    foods = get_expiring_foods(db, days_ahead, limit=limit)
     return foods
 
 
 @app.get("/inventory/low-stock", response_model=List[FoodResponse])
-async def get_low_stock_foods_endpoint(
+def get_low_stock_foods_endpoint(
     threshold: int = Query(5, ge=0, description="Quantity threshold"),
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
     """Get foods with low stock (quantity below threshold)."""
-    foods = get_low_stock_foods(db, threshold)
+    foods = get_low_stock_foods(db, threshold, limit=limit)
     return foods
 
 
@@ -457,8 +517,7 @@ async def get_low_stock_foods_endpoint(
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Handle HTTP exceptions."""
-    from fastapi.responses import JSONResponse
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "detail": exc.detail,
@@ -472,8 +531,7 @@ async def http_exception_handler(request, exc):
 async def general_exception_handler(request, exc):
     """Handle general exceptions."""
     logger.error(f"Unhandled exception: {exc}")
-    from fastapi.responses import JSONResponse
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "detail": "Internal server error",
@@ -485,4 +543,12 @@ async def general_exception_handler(request, exc):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    
+    # Default to one server process per core (at most 8), and export the
+    # count so each worker process sizes its detection pool to match
+    workers = int(os.getenv("WEB_CONCURRENCY", min(os.cpu_count() or 1, 8)))
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    uvicorn.run(
+        "main:app", host="0.0.0.0", port=8000,
+        workers=workers, loop="uvloop", http="httptools"
+    )
@@ -3,13 +3,18 @@ SQLAlchemy models for the food tracking system.
 Defines the database schema using SQLAlchemy ORM.
 """
 
-from sqlalchemy import Column, String, Integer, Float, Date, DateTime, Text, JSON, ForeignKey, CheckConstraint, LargeBinary
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy import String, Integer, Float, Date, DateTime, JSON, ForeignKey, CheckConstraint, LargeBinary, Index, Uuid
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
+from datetime import date, datetime
+from typing import List, Optional
 import uuid
+import base64
 
-Base = declarative_base()
+
+class Base(DeclarativeBase):
+    """Declarative base class for all models."""
+    pass
 
 
 class Food(Base):
@@ -17,28 +22,34 @@ class Food(Base):
     
     __tablename__ = "foods"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    barcode = Column(String, nullable=False, index=True)
-    name = Column(String, nullable=False)
-    brand = Column(String)
-    category = Column(String, index=True)
-    calories = Column(Integer)
-    protein = Column(Float)
-    fat = Column(Float)
-    carbs = Column(Float)
-    fiber = Column(Float)
-    sugars = Column(Float)
-    sodium = Column(Float)
-    allergens = Column(JSON)
-    expiry_date = Column(Date, index=True)
-    quantity = Column(Integer, default=0)
-    location = Column(String)
-    barcode_image_url = Column(String)
-    barcode_image_data = Column(LargeBinary)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+    barcode: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    brand: Mapped[Optional[str]] = mapped_column(String)
+    category: Mapped[Optional[str]] = mapped_column(String, index=True)
+    calories: Mapped[Optional[int]] = mapped_column(Integer)
+    protein: Mapped[Optional[float]] = mapped_column(Float)
+    fat: Mapped[Optional[float]] = mapped_column(Float)
+    carbs: Mapped[Optional[float]] = mapped_column(Float)
+    fiber: Mapped[Optional[float]] = mapped_column(Float)
+    sugars: Mapped[Optional[float]] = mapped_column(Float)
+    sodium: Mapped[Optional[float]] = mapped_column(Float)
+    allergens: Mapped[Optional[List[str]]] = mapped_column(JSON)
+    expiry_date: Mapped[Optional[date]] = mapped_column(Date, index=True)
+    quantity: Mapped[Optional[int]] = mapped_column(Integer, default=0, index=True)
+    location: Mapped[Optional[str]] = mapped_column(String)
+    barcode_image_url: Mapped[Optional[str]] = mapped_column(String)
+    barcode_image_data: Mapped[Optional[bytes]] = mapped_column(LargeBinary)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    
+    # Composite index covering the expiring-foods query
+    __table_args__ = (
+        Index("ix_food_exp_qty", "expiry_date", "quantity"),
+        Index("ix_food_category_expiry", "category", "expiry_date"),
+    )
     
     # Relationship to nutrition logs
-    nutrition_logs = relationship("NutritionLog", back_populates="food", cascade="all, delete-orphan")
+    nutrition_logs: Mapped[List["NutritionLog"]] = relationship(back_populates="food", cascade="all, delete-orphan")
     
     def __repr__(self):
         return f"<Food(id={self.id}, barcode={self.barcode}, name={self.name}, quantity={self.quantity})>"
@@ -63,7 +74,7 @@ class Food(Base):
             "quantity": self.quantity,
             "location": self.location,
             "barcode_image_url": self.barcode_image_url,
-            "barcode_image_data": self.barcode_image_data.decode('base64') if self.barcode_image_data else None,
+            "barcode_image_data": base64.b64encode(self.barcode_image_data).decode('ascii') if self.barcode_image_data else None,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
 
@@ -73,11 +84,11 @@ class NutritionLog(Base):
     
     __tablename__ = "nutrition_logs"
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    food_id = Column(String, ForeignKey("foods.id", ondelete="CASCADE"), nullable=False, index=True)
-    quantity = Column(Integer, nullable=False)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
-    action = Column(String, nullable=False, index=True)
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+    food_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("foods.id", ondelete="CASCADE"), nullable=False, index=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    timestamp: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+    action: Mapped[str] = mapped_column(String, nullable=False, index=True)
     
     # Add check constraint for valid actions
     __table_args__ = (
@@ -88,7 +99,7 @@ class NutritionLog(Base):
     )
     
     # Relationship to food
-    food = relationship("Food", back_populates="nutrition_logs")
+    food: Mapped["Food"] = relationship(back_populates="nutrition_logs")
     
     def __repr__(self):
         return f"<NutritionLog(id={self.id}, food_id={self.food_id}, action={self.action}, quantity={self.quantity})>"
@@ -0,0 +1,186 @@
+"""
+OpenFoodFacts product lookups for scanned barcodes.
+Products are cached in-process and, when REDIS_URL is set, in Redis so that
+all workers share cache hits.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+import orjson
+from cachetools import TTLCache
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+OPENFOODFACTS_URL = "https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
+
+# Cached products are kept for a day
+PRODUCT_CACHE_TTL = 24 * 60 * 60
+
+# (food field, OpenFoodFacts nutriment key, digits to round to). Calories
+# round to a whole number.
+NUTRIMENT_FIELDS = (
+    ("calories", "energy-kcal_100g", None),
+    ("protein", "proteins_100g", 2),
+    ("fat", "fat_100g", 2),
+    ("carbs", "carbohydrates_100g", 2),
+    ("fiber", "fiber_100g", 2),
+    ("sugars", "sugars_100g", 2),
+    ("sodium", "sodium_100g", 2),
+)
+
+# In-process cache, checked before Redis
+product_cache = TTLCache(maxsize=10_000, ttl=PRODUCT_CACHE_TTL)
+
+# Lookups in progress, so concurrent scans of the same barcode share one
+# upstream request instead of each calling OpenFoodFacts
+inflight_lookups: Dict[str, asyncio.Task] = {}
+
+# Optional shared cache for multi-worker deployments
+REDIS_URL = os.getenv("REDIS_URL")
+redis_client = aioredis.from_url(REDIS_URL) if REDIS_URL and aioredis else None
+if REDIS_URL and aioredis is None:
+    logger.warning("REDIS_URL is set but the redis package is not installed; "
+                   "caching OpenFoodFacts products in memory only")
+
+
+# Async client for OpenFoodFacts lookups, created on first use and reused
+# across requests so connections stay open; HTTP/2 multiplexes concurrent
+# lookups over one connection
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared OpenFoodFacts HTTP client, creating it if needed."""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+            timeout=10
+        )
+    return http_client
+
+
+async def close_clients() -> None:
+    """Close the shared HTTP and Redis clients. Called on application shutdown."""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+    if redis_client is not None:
+        await redis_client.aclose()
+
+
+def redis_key(barcode: str) -> str:
+    """Get the Redis key for a cached product."""
+    return f"off:{barcode}"
+
+
+async def fetch_off_product(barcode: str) -> Optional[Dict[str, Any]]:
+    """
+    Get a product from OpenFoodFacts, using the caches when possible.
+
+    Args:
+        barcode: Product barcode
+
+    Returns:
+        Dict or None: The OpenFoodFacts product, or None if it is not in their database
+
+    Raises:
+        httpx.HTTPError: If OpenFoodFacts could not be reached
+    """
+    product = product_cache.get(barcode)
+    if product is not None:
+        return product
+
+    task = inflight_lookups.get(barcode)
+    if task is None:
+        task = asyncio.ensure_future(load_off_product(barcode))
+        inflight_lookups[barcode] = task
+        task.add_done_callback(lambda _: inflight_lookups.pop(barcode, None))
+
+    # Shielded so one cancelled request doesn't cancel the shared lookup
+    return await asyncio.shield(task)
+
+
+async def load_off_product(barcode: str) -> Optional[Dict[str, Any]]:
+    """Load a product from Redis or OpenFoodFacts and populate the caches."""
+    if redis_client is not None:
+        try:
+            cached = await redis_client.get(redis_key(barcode))
+        except Exception as e:
+            logger.warning(f"Redis lookup failed for barcode {barcode}: {e}")
+            cached = None
+
+        if cached is not None:
+            product = orjson.loads(cached)
+            product_cache[barcode] = product
+            return product
+
+    response = await get_http_client().get(OPENFOODFACTS_URL.format(barcode=barcode))
+    off_data = response.json() if response.status_code == 200 else None
+
+    # Unknown products are not cached so that newly added ones show up
+    if not off_data or off_data.get('status') == 0:
+        return None
+
+    product = off_data['product']
+    product_cache[barcode] = product
+
+    if redis_client is not None:
+        try:
+            await redis_client.set(redis_key(barcode), orjson.dumps(product), ex=PRODUCT_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"Redis store failed for barcode {barcode}: {e}")
+
+    return product
+
+
+def product_to_food_data(barcode: str, product: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map an OpenFoodFacts product to food fields. Empty and missing values
+    are left out.
+    """
+    food_data = {"barcode": barcode}
+    
+    name = (product.get('product_name') or 'Unknown Product').strip()
+    if name:
+        food_data["name"] = name
+    brand = (product.get('brands') or '').strip()
+    if brand:
+        food_data["brand"] = brand
+    category = (product.get('categories') or '').partition(',')[0].strip()
+    if category:
+        food_data["category"] = category
+    
+    nutriments = product.get('nutriments') or {}
+    for field, key, ndigits in NUTRIMENT_FIELDS:
+        value = nutriments.get(key)
+        if value:
+            food_data[field] = round(value, ndigits)
+    
+    allergens = product.get('allergens')
+    if allergens:
+        food_data["allergens"] = allergens.split(',')
+    
+    food_data["quantity"] = 1
+    return food_data
+
+
+async def invalidate_off_product(barcode: str) -> None:
+    """Remove a cached product so the next lookup fetches it again."""
+    product_cache.pop(barcode, None)
+    if redis_client is not None:
+        try:
+            await redis_client.delete(redis_key(barcode))
+        except Exception as e:
+            logger.warning(f"Redis delete failed for barcode {barcode}: {e}")
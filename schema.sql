@@ -40,6 +40,9 @@ CREATE TABLE IF NOT EXISTS nutrition_logs (
 CREATE INDEX IF NOT EXISTS idx_foods_barcode ON foods(barcode);
 CREATE INDEX IF NOT EXISTS idx_foods_category ON foods(category);
 CREATE INDEX IF NOT EXISTS idx_foods_expiry_date ON foods(expiry_date);
+CREATE INDEX IF NOT EXISTS idx_foods_quantity ON foods(quantity);
+CREATE INDEX IF NOT EXISTS idx_foods_expiry_date_quantity ON foods(expiry_date, quantity);
+CREATE INDEX IF NOT EXISTS idx_foods_category_expiry_date ON foods(category, expiry_date);
 CREATE INDEX IF NOT EXISTS idx_nutrition_logs_food_id ON nutrition_logs(food_id);
 CREATE INDEX IF NOT EXISTS idx_nutrition_logs_timestamp ON nutrition_logs(timestamp);
 CREATE INDEX IF NOT EXISTS idx_nutrition_logs_action ON nutrition_logs(action);
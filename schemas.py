@@ -2,7 +2,7 @@
 Pydantic schemas for request/response validation in the FastAPI application.
 """
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime, date
 from uuid import UUID
@@ -41,7 +41,8 @@ class BarcodeImageUploadRequest(BaseModel):
     imageFormat: str = Field(..., description="Image format (e.g., 'jpeg', 'png')")
     action: str = Field("scan", description="Action to perform: 'scan' or 'scan_and_save'")
     
-    @validator('action')
+    @field_validator('action')
+    @classmethod
     def validate_action(cls, v):
         valid_actions = ['scan', 'scan_and_save']
         if v not in valid_actions:
@@ -93,7 +94,8 @@ class NutritionLogBase(BaseModel):
     quantity: int = Field(..., gt=0, description="Quantity involved in the action")
     action: str = Field(..., description="Action performed")
     
-    @validator('action')
+    @field_validator('action')
+    @classmethod
     def validate_action(cls, v):
         valid_actions = ['added', 'removed', 'consumed', 'expired']
         if v not in valid_actions:
@@ -128,7 +130,8 @@ class QuantityUpdateRequest(BaseModel):
     quantity_change: int = Field(..., description="Quantity change (positive or negative)")
     action: str = Field(..., description="Action being performed")
     
-    @validator('action')
+    @field_validator('action')
+    @classmethod
     def validate_action(cls, v):
         valid_actions = ['added', 'removed', 'consumed', 'expired']
         if v not in valid_actions:
@@ -140,7 +143,8 @@ class BulkImportRequest(BaseModel):
     """Schema for bulk import requests."""
     data: List[Dict[str, Any]] = Field(..., description="List of food items to import")
     
-    @validator('data')
+    @field_validator('data')
+    @classmethod
     def validate_data(cls, v):
         if not v:
             raise ValueError('Data list cannot be empty')
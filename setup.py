@@ -6,116 +6,178 @@ This script helps set up the database and install dependencies.
 
 import os
 import sys
-import subprocess
-import sqlite3
 from pathlib import Path
 
-def install_requirements():
-    """Install Python requirements."""
-    print("Installing Python requirements...")
+# SQLite schema and indexes, created in one transaction
+SCHEMA_SQL = """
+BEGIN IMMEDIATE;
+
+CREATE TABLE IF NOT EXISTS foods (
+    id TEXT PRIMARY KEY,
+    barcode TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    brand TEXT,
+    category TEXT,
+    calories INTEGER,
+    protein REAL,
+    fat REAL,
+    carbs REAL,
+    fiber REAL,
+    sugars REAL,
+    sodium REAL,
+    allergens TEXT,
+    expiry_date TEXT,
+    quantity INTEGER DEFAULT 0,
+    location TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS nutrition_logs (
+    id TEXT PRIMARY KEY,
+    food_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    action TEXT NOT NULL CHECK (action IN ('added', 'removed', 'consumed', 'expired')),
+    FOREIGN KEY (food_id) REFERENCES foods (id) ON DELETE CASCADE
+);
+
+-- Indexes for the inventory and nutrition log queries (names match the
+-- SQLAlchemy models where they cover the same columns)
+CREATE INDEX IF NOT EXISTS ix_foods_expiry_date ON foods (expiry_date);
+CREATE INDEX IF NOT EXISTS ix_foods_quantity ON foods (quantity);
+CREATE INDEX IF NOT EXISTS ix_food_category_expiry ON foods (category, expiry_date);
+CREATE INDEX IF NOT EXISTS ix_foods_category_location ON foods (category, location);
+CREATE INDEX IF NOT EXISTS ix_logs_food_time ON nutrition_logs (food_id, timestamp DESC);
+CREATE INDEX IF NOT EXISTS ix_logs_action_time ON nutrition_logs (action, timestamp);
+
+COMMIT;
+"""
+
+# Contents of the .env file created by setup
+ENV_TEMPLATE = """# Database Configuration (SQLite)
+DATABASE_URL=sqlite:///./food_tracking.db
+
+# API Configuration
+API_HOST=0.0.0.0
+API_PORT=8000
+DEBUG=True
+
+# Logging
+LOG_LEVEL=INFO
+"""
+
+def install_requirements(requirements_path, log):
+    """
+    Install Python requirements, with uv if it is available, otherwise pip.
+    Skipped when requirements.txt and the interpreter are unchanged since the
+    last successful install.
+    """
+    import hashlib
+    
+    stamp_path = requirements_path.with_name(".install-stamp")
     try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
-        print("✅ Requirements installed successfully")
-        return True
-    except subprocess.CalledProcessError as e:
+        hasher = hashlib.blake2b(requirements_path.read_bytes(), digest_size=16)
+        hasher.update(sys.executable.encode())
+        digest = hasher.hexdigest()
+        if stamp_path.exists() and stamp_path.read_text() == digest:
+            log.append("✅ Requirements unchanged since last install")
+            return True
+    except OSError as e:
         print(f"❌ Error installing requirements: {e}")
         return False
+    
+    import shutil
+    import subprocess
+    
+    print("Installing Python requirements...")
+    
+    commands = []
+    uv = shutil.which("uv")
+    if uv:
+        # uv resolves and downloads packages in parallel
+        commands.append([uv, "pip", "install", "--python", sys.executable, "-r", str(requirements_path)])
+    # Prebuilt wheels only, so no package is built from source...
+    commands.append([sys.executable, "-m", "pip", "install", "--prefer-binary", "--only-binary=:all:",
+                     "-r", str(requirements_path)])
+    # ...falling back to plain pip for packages without a wheel
+    commands.append([sys.executable, "-m", "pip", "install", "-r", str(requirements_path)])
+    
+    for command in commands:
+        try:
+            subprocess.check_call(command)
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"⚠️  {' '.join(command[:4])} failed: {e}")
+            continue
+        
+        # The install itself succeeded, so a stamp that can't be written
+        # only means the next run installs again
+        try:
+            stamp_path.write_text(digest)
+        except OSError as e:
+            print(f"⚠️  Could not write {stamp_path.name}: {e}")
+        log.append("✅ Requirements installed successfully")
+        return True
+    
+    print("❌ Error installing requirements")
+    return False
 
-def setup_sqlite_database():
+def setup_sqlite_database(db_path, log):
     """Set up SQLite database as a fallback."""
-    print("Setting up SQLite database...")
+    log.append("Setting up SQLite database...")
     
-    # Create database file
-    db_path = Path("food_tracking.db")
     if db_path.exists():
-        print("✅ SQLite database already exists")
+        log.append("✅ SQLite database already exists")
         return True
     
     try:
-        # Create database and tables
-        conn = sqlite3.connect(str(db_path))
-        cursor = conn.cursor()
+        # Only needed when the database has to be created
+        import sqlite3
         
-        # Create foods table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS foods (
-                id TEXT PRIMARY KEY,
-                barcode TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                brand TEXT,
-                category TEXT,
-                calories INTEGER,
-                protein REAL,
-                fat REAL,
-                carbs REAL,
-                fiber REAL,
-                sugars REAL,
-                sodium REAL,
-                allergens TEXT,
-                expiry_date TEXT,
-                quantity INTEGER DEFAULT 0,
-                location TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        # Create database and tables. Autocommit mode, so the script's own
+        # BEGIN IMMEDIATE/COMMIT is the only transaction
+        conn = sqlite3.connect(str(db_path), isolation_level=None)
+        try:
+            # page_size only takes effect before the first write; WAL mode
+            # is stored in the file, so it persists for every later connection
+            conn.execute("PRAGMA page_size=8192")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA_SQL)
+        finally:
+            conn.close()
         
-        # Create nutrition_logs table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS nutrition_logs (
-                id TEXT PRIMARY KEY,
-                food_id TEXT NOT NULL,
-                quantity INTEGER NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                action TEXT NOT NULL CHECK (action IN ('added', 'removed', 'consumed', 'expired')),
-                FOREIGN KEY (food_id) REFERENCES foods (id) ON DELETE CASCADE
-            )
-        """)
-        
-        conn.commit()
-        conn.close()
-        
-        print("✅ SQLite database created successfully")
+        log.append("✅ SQLite database created successfully")
         return True
         
     except Exception as e:
         print(f"❌ Error creating SQLite database: {e}")
         return False
 
-def create_env_file():
+def create_env_file(env_path, log):
     """Create .env file with SQLite configuration."""
-    env_content = """# Database Configuration (SQLite)
-DATABASE_URL=sqlite:///./food_tracking.db
-
-# API Configuration
-API_HOST=0.0.0.0
-API_PORT=8000
-DEBUG=True
-
-# Logging
-LOG_LEVEL=INFO
-"""
-    
-    env_path = Path(".env")
     if env_path.exists():
-        print("✅ .env file already exists")
+        log.append("✅ .env file already exists")
         return True
     
     try:
-        with open(env_path, "w") as f:
-            f.write(env_content)
-        print("✅ .env file created successfully")
+        env_path.write_text(ENV_TEMPLATE, encoding="utf-8")
+        log.append("✅ .env file created successfully")
         return True
     except Exception as e:
         print(f"❌ Error creating .env file: {e}")
         return False
 
-def test_database_connection():
+def test_database_connection(db_path, log):
     """Test database connection."""
-    print("Testing database connection...")
+    log.append("Testing database connection...")
+    
+    # Without DATABASE_URL the app defaults to food_tracking.db in the
+    # working directory, so point it at the database setup just created
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{db_path}")
     try:
         from database import test_connection
         if test_connection():
-            print("✅ Database connection successful")
+            log.append("✅ Database connection successful")
             return True
         else:
             print("❌ Database connection failed")
@@ -129,38 +191,48 @@ def main():
     print("🚀 Setting up Food Tracking Backend...")
     print("=" * 50)
     
-    # Change to backend directory
-    backend_dir = Path(__file__).parent
-    os.chdir(backend_dir)
+    # Resolve everything against the backend directory rather than
+    # changing the working directory
+    backend_dir = Path(__file__).resolve().parent
+    db_path = backend_dir / "food_tracking.db"
     
     success = True
     
+    # Status messages are collected and written out in one go at the end;
+    # errors are still printed as they happen
+    log = []
+    
     # Install requirements
-    if not install_requirements():
+    if not install_requirements(backend_dir / "requirements.txt", log):
         success = False
     
     # Create .env file
-    if not create_env_file():
+    if not create_env_file(backend_dir / ".env", log):
         success = False
     
     # Set up SQLite database
-    if not setup_sqlite_database():
+    if not setup_sqlite_database(db_path, log):
         success = False
     
-    # Test database connection
-    if not test_database_connection():
+    # Test database connection, only if everything it depends on is in
+    # place (it imports the app's database module and its dependencies)
+    if success and not test_database_connection(db_path, log):
         success = False
     
-    print("=" * 50)
+    log.append("=" * 50)
     if success:
-        print("🎉 Setup completed successfully!")
-        print("\nTo start the backend server, run:")
-        print("  python main.py")
-        print("\nOr with uvicorn:")
-        print("  uvicorn main:app --reload --host 0.0.0.0 --port 8000")
-        print("\nAPI documentation will be available at:")
-        print("  http://localhost:8000/docs")
-    else:
+        log.extend([
+            "🎉 Setup completed successfully!",
+            "\nTo start the backend server, run:",
+            "  python main.py",
+            "\nOr with uvicorn:",
+            "  uvicorn main:app --reload --host 0.0.0.0 --port 8000",
+            "\nAPI documentation will be available at:",
+            "  http://localhost:8000/docs",
+        ])
+    sys.stdout.write("\n".join(log) + "\n")
+    
+    if not success:
         print("❌ Setup failed. Please check the errors above.")
         sys.exit(1)
 